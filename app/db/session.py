@@ -1,18 +1,29 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from app.config import settings
 from app.models.database import Base
 
 # Create engine
 SQLALCHEMY_DATABASE_URL = settings.database_url
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in SQLALCHEMY_DATABASE_URL else {"connect_timeout": 10},
-    echo=settings.debug,
-    pool_pre_ping=True,  # Verify connections before using
-    pool_recycle=300,  # Recycle connections every 5 minutes
-)
+if SQLALCHEMY_DATABASE_URL in ("sqlite://", "sqlite:///:memory:"):
+    # Each SQLite connection gets its own private in-memory database, so hand
+    # every session the same connection (used by the test suite)
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        echo=settings.debug,
+        poolclass=StaticPool,
+    )
+else:
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False} if "sqlite" in SQLALCHEMY_DATABASE_URL else {"connect_timeout": 10},
+        echo=settings.debug,
+        pool_pre_ping=True,  # Verify connections before using
+        pool_recycle=300,  # Recycle connections every 5 minutes
+    )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -2,7 +2,9 @@
 Color Psychology for Product Categories
 Based on Creative Blueprint Section 4
 """
-from typing import List
+import re
+from functools import lru_cache
+from typing import List, Tuple
 
 CATEGORY_PALETTES = {
     'health_supplements': {
@@ -47,11 +49,26 @@ CATEGORY_PALETTES = {
     }
 }
 
+# Checked in order; the first category with a matching keyword wins
+CATEGORY_KEYWORDS = {
+    'health_supplements': ['vitamin', 'supplement', 'gummy', 'gummies', 'organic', 'natural', 'health', 'probiotic', 'collagen', 'omega'],
+    'fitness': ['fitness', 'workout', 'gym', 'protein', 'exercise', 'sport', 'athletic', 'muscle'],
+    'baby_kids': ['baby', 'kid', 'child', 'infant', 'toddler', 'nursery', 'newborn'],
+    'tech_electronics': ['tech', 'electronic', 'gadget', 'smart', 'device', 'digital', 'wireless', 'bluetooth'],
+    'home_kitchen': ['kitchen', 'home', 'cooking', 'utensil', 'organizer', 'storage', 'cleaning'],
+    'beauty_skincare': ['beauty', 'skincare', 'cosmetic', 'serum', 'cream', 'moisturizer', 'anti-aging'],
+    'outdoor_sports': ['outdoor', 'camping', 'hiking', 'fishing', 'hunting', 'sports', 'adventure'],
+}
 
-def get_color_guidance(category: str) -> str:
-    """Generate color palette guidance for prompts"""
-    palette = CATEGORY_PALETTES.get(category, CATEGORY_PALETTES['default'])
+# One alternation per category so each is a single scan of the text. Plain
+# substring matching (no word boundaries), same as checking `kw in text`.
+_CATEGORY_PATTERNS = {
+    category: re.compile('|'.join(re.escape(kw) for kw in cat_keywords))
+    for category, cat_keywords in CATEGORY_KEYWORDS.items()
+}
 
+
+def _render_color_guidance(palette: dict) -> str:
     return f"""
 [COLOR PSYCHOLOGY]
 - Primary palette: {', '.join(palette['primary'])}
@@ -60,24 +77,29 @@ def get_color_guidance(category: str) -> str:
 """
 
 
+# Guidance text is fixed per category, so render it once at import
+_COLOR_GUIDANCE = {
+    category: _render_color_guidance(palette)
+    for category, palette in CATEGORY_PALETTES.items()
+}
+
+
+def get_color_guidance(category: str) -> str:
+    """Generate color palette guidance for prompts"""
+    return _COLOR_GUIDANCE.get(category, _COLOR_GUIDANCE['default'])
+
+
 def infer_category(product_title: str, keywords: List[str]) -> str:
     """Infer product category from title and keywords"""
-    title_lower = product_title.lower()
-    keywords_lower = [k.lower() for k in keywords]
-    all_text = title_lower + ' ' + ' '.join(keywords_lower)
+    return _infer_category(product_title, tuple(keywords))
 
-    category_keywords = {
-        'health_supplements': ['vitamin', 'supplement', 'gummy', 'gummies', 'organic', 'natural', 'health', 'probiotic', 'collagen', 'omega'],
-        'fitness': ['fitness', 'workout', 'gym', 'protein', 'exercise', 'sport', 'athletic', 'muscle'],
-        'baby_kids': ['baby', 'kid', 'child', 'infant', 'toddler', 'nursery', 'newborn'],
-        'tech_electronics': ['tech', 'electronic', 'gadget', 'smart', 'device', 'digital', 'wireless', 'bluetooth'],
-        'home_kitchen': ['kitchen', 'home', 'cooking', 'utensil', 'organizer', 'storage', 'cleaning'],
-        'beauty_skincare': ['beauty', 'skincare', 'cosmetic', 'serum', 'cream', 'moisturizer', 'anti-aging'],
-        'outdoor_sports': ['outdoor', 'camping', 'hiking', 'fishing', 'hunting', 'sports', 'adventure'],
-    }
 
-    for category, cat_keywords in category_keywords.items():
-        if any(kw in all_text for kw in cat_keywords):
+@lru_cache(maxsize=1024)
+def _infer_category(product_title: str, keywords: Tuple[str, ...]) -> str:
+    all_text = ' '.join((product_title, *keywords)).lower()
+
+    for category, pattern in _CATEGORY_PATTERNS.items():
+        if pattern.search(all_text):
             return category
 
     return 'default'
@@ -3,7 +3,9 @@ Prompt Engineering Engine
 Based on Architecture Document Section 6 and Creative Blueprint
 MASTER Level: Now uses intelligent Creative Brief system for complete specifications
 """
-from typing import Dict, List, Optional
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
 from dataclasses import dataclass, field
 from .templates import main_image, infographic, lifestyle, comparison
 from .intent_modifiers import get_intent_modifiers
@@ -22,10 +24,12 @@ from .creative_brief import (
 class ProductContext:
     """Context for generating prompts"""
     title: str
-    features: List[str]  # 3 key features
+    # Read-only sequences/mappings are accepted (lists and tuples alike); the
+    # builders copy before padding, so a shared context is never modified
+    features: Sequence[str]  # 3 key features
     target_audience: str
-    keywords: List[str]
-    intents: Dict[str, List[str]]  # keyword -> list of intent types
+    keywords: Sequence[str]
+    intents: Mapping[str, Sequence[str]]  # keyword -> list of intent types
     # Brand and style options
     brand_colors: List[str] = field(default_factory=list)
     brand_name: Optional[str] = None
@@ -42,6 +46,31 @@ class ProductContext:
     # Cached creative brief
     _creative_brief: Optional[ListingBrief] = field(default=None, repr=False)
 
+    def prompt_cache_key(self) -> Tuple:
+        """
+        Hashable snapshot of every field the legacy template prompt reads.
+
+        Built on each call, so mutating the context simply yields a new key.
+        Intent lists are sorted because only the set of intents matters.
+        """
+        return (
+            self.title,
+            tuple(self.features),
+            self.target_audience,
+            tuple(self.keywords),
+            tuple(sorted((kw, tuple(sorted(intents))) for kw, intents in self.intents.items())),
+            tuple(self.brand_colors),
+            self.brand_name,
+            self.has_logo,
+            self.has_style_reference,
+            self.color_count,
+            tuple(self.color_palette),
+        )
+
+
+# Upper bound on memoized legacy prompts per engine (least recently used evicted first)
+LEGACY_PROMPT_CACHE_SIZE = 512
+
 
 class PromptEngine:
     """
@@ -66,6 +95,11 @@ class PromptEngine:
             'comparison': comparison.TEMPLATE,
         }
         self.brief_generator = get_brief_generator()
+        # Legacy prompts are pure functions of template + context content, so
+        # re-rendering the same product returns the stored string. The engine is
+        # a process-wide singleton, so cache reads/writes go through the lock.
+        self._legacy_prompt_cache: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._legacy_prompt_lock = threading.Lock()
 
     def build_prompt(
         self,
@@ -186,7 +220,33 @@ LOGO INTEGRATION:
         """
         # Get base template
         template = self.templates[image_type]
+        style_id = style_override or context.style_id
 
+        # Keyed on the template text itself, so swapping templates invalidates
+        cache_key = (template, image_type, style_id, context.prompt_cache_key())
+        with self._legacy_prompt_lock:
+            prompt = self._legacy_prompt_cache.get(cache_key)
+            if prompt is not None:
+                self._legacy_prompt_cache.move_to_end(cache_key)
+                return prompt
+
+        # Render outside the lock; a concurrent miss on the same key just
+        # renders the identical string twice
+        prompt = self._render_legacy_prompt(template, image_type, context, style_id)
+        with self._legacy_prompt_lock:
+            prompt = self._legacy_prompt_cache.setdefault(cache_key, prompt)
+            if len(self._legacy_prompt_cache) > LEGACY_PROMPT_CACHE_SIZE:
+                self._legacy_prompt_cache.popitem(last=False)
+        return prompt
+
+    def _render_legacy_prompt(
+        self,
+        template: str,
+        image_type: str,
+        context: ProductContext,
+        style_id: Optional[str],
+    ) -> str:
+        """Expand a legacy template for the given context (uncached)"""
         # Get intent modifiers for this image type
         intent_modifiers = get_intent_modifiers(image_type, context.intents)
 
@@ -195,7 +255,7 @@ LOGO INTEGRATION:
         color_guidance = get_color_guidance(category)
 
         # Ensure we have at least 3 features
-        features = context.features + [''] * (3 - len(context.features))
+        features = list(context.features) + [''] * (3 - len(context.features))
 
         # Build the base prompt
         prompt = template.format(
@@ -210,7 +270,6 @@ LOGO INTEGRATION:
         )
 
         # Add style modifier (highest priority - defines the visual language)
-        style_id = style_override or context.style_id
         if style_id:
             style = get_style_preset(style_id)
             if style:
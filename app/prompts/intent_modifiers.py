@@ -2,7 +2,8 @@
 Keyword Intent Modifiers for Visual Proof
 Based on Creative Blueprint Section 5 - Chris Rawlings' PPC Loop
 """
-from typing import Dict, List
+from itertools import combinations
+from typing import Dict, FrozenSet, List, Tuple
 
 # Visual proof statements for each intent type
 INTENT_VISUAL_PROOF = {
@@ -42,6 +43,34 @@ IMAGE_TYPE_INTENT_PRIORITY = {
     'comparison': ['comparison', 'durability'],
 }
 
+DEFAULT_INTENT_MODIFIER = "Focus on professional product presentation and visual appeal."
+
+
+def _render_intent_modifiers(image_type: str, intents: FrozenSet[str]) -> str:
+    """Render the modifier block for the given priority intents of an image type"""
+    modifiers = []
+    for intent in IMAGE_TYPE_INTENT_PRIORITY.get(image_type, []):
+        if intent in intents:
+            proof_statements = INTENT_VISUAL_PROOF.get(intent, [])
+            if proof_statements:
+                modifiers.append(f"[{intent.upper()} INTENT]")
+                modifiers.extend(f"- {stmt}" for stmt in proof_statements)
+
+    if not modifiers:
+        return DEFAULT_INTENT_MODIFIER
+
+    return '\n'.join(modifiers)
+
+
+# Only an image type's priority intents affect its modifiers, so every
+# (image type, subset of priority intents) result is rendered at import
+_INTENT_MODIFIERS: Dict[Tuple[str, FrozenSet[str]], str] = {
+    (image_type, frozenset(subset)): _render_intent_modifiers(image_type, frozenset(subset))
+    for image_type, priority in IMAGE_TYPE_INTENT_PRIORITY.items()
+    for size in range(len(priority) + 1)
+    for subset in combinations(priority, size)
+}
+
 
 def get_intent_modifiers(
     image_type: str,
@@ -57,24 +86,14 @@ def get_intent_modifiers(
     Returns:
         String of intent modifiers to inject into the prompt
     """
+    priority_intents = IMAGE_TYPE_INTENT_PRIORITY.get(image_type)
+    if not priority_intents:
+        return DEFAULT_INTENT_MODIFIER
+
     # Collect all unique intents from keywords
     all_intents = set()
     for intents in keyword_intents.values():
         all_intents.update(intents)
 
-    # Get priority intents for this image type
-    priority_intents = IMAGE_TYPE_INTENT_PRIORITY.get(image_type, [])
-
-    # Build modifier string
-    modifiers = []
-    for intent in priority_intents:
-        if intent in all_intents:
-            proof_statements = INTENT_VISUAL_PROOF.get(intent, [])
-            if proof_statements:
-                modifiers.append(f"[{intent.upper()} INTENT]")
-                modifiers.extend(f"- {stmt}" for stmt in proof_statements)
-
-    if not modifiers:
-        return "Focus on professional product presentation and visual appeal."
-
-    return '\n'.join(modifiers)
+    present = frozenset(intent for intent in priority_intents if intent in all_intents)
+    return _INTENT_MODIFIERS[(image_type, present)]
@@ -0,0 +1,140 @@
+"""
+Shared pytest configuration.
+
+Points the application at a single in-memory SQLite database before anything
+imports ``app.config``, so schema setup and per-test writes never touch disk,
+and provides the shared app, schema, rolled-back ``db_session``, API
+``client`` and prompt-context fixtures.
+"""
+import os
+from types import MappingProxyType
+
+# app.db.session builds a StaticPool engine for in-memory URLs, so every session
+# (tests, request handlers, background workers) shares one database. Under
+# pytest-xdist each worker is its own process and therefore gets its own
+# database, so any distribution mode is safe; ``--dist loadfile`` additionally
+# keeps module-scoped fixtures (schema, TestClient) from being rebuilt on every
+# worker that picks up a test from the same module.
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+
+import pytest  # noqa: E402
+
+from app.db.session import SessionLocal, engine, get_db  # noqa: E402
+from app.models.database import Base  # noqa: E402
+from app.prompts import ProductContext, get_prompt_engine  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    """FastAPI app, imported lazily so schema/unit tests don't pay for app startup"""
+    from app.main import app as fastapi_app
+    return fastapi_app
+
+
+@pytest.fixture(scope="session")
+def registered_paths(app):
+    """Frozenset of route paths, built once per session from the app's OpenAPI schema"""
+    return frozenset(app.openapi()["paths"])
+
+
+@pytest.fixture(scope="module")
+def _schema():
+    """Create the schema once per test module.
+
+    Module (not session) scope because some modules still create and drop the
+    tables around each of their own tests on the shared engine.
+    """
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def db_session(_schema):
+    """DB session whose writes are rolled back when the test ends.
+
+    The session joins an outer transaction through SAVEPOINTs, so service-level
+    commits stay inside it. pysqlite never emits BEGIN on its own, so autocommit
+    is switched off on the raw connection and BEGIN is issued explicitly.
+    """
+    connection = engine.connect()
+    dbapi_connection = connection.connection.dbapi_connection
+    isolation_level = dbapi_connection.isolation_level
+    dbapi_connection.isolation_level = None
+    connection.exec_driver_sql("BEGIN")
+    session = SessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+    try:
+        yield session
+    finally:
+        session.close()
+        connection.rollback()
+        dbapi_connection.isolation_level = isolation_level
+        connection.close()
+
+
+@pytest.fixture
+def client(app, _client, db_session):
+    """The module's ``_client`` with requests sharing the test's rolled-back DB session.
+
+    Modules that use it define a module-scoped ``_client`` fixture holding a
+    TestClient plus whatever auth/storage overrides they need.
+    """
+    app.dependency_overrides[get_db] = lambda: db_session
+    try:
+        yield _client
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+
+def _frozen_context(**fields) -> ProductContext:
+    """ProductContext whose sequences are tuples and intents a read-only mapping"""
+    fields["features"] = tuple(fields["features"])
+    fields["keywords"] = tuple(fields["keywords"])
+    fields["intents"] = MappingProxyType({kw: tuple(intents) for kw, intents in fields["intents"].items()})
+    return ProductContext(**fields)
+
+
+@pytest.fixture(scope="session")
+def sample_context():
+    """Sample product context for testing (shared, so frozen against mutation)"""
+    return _frozen_context(
+        title="Organic Vitamin D3 Gummies - Natural Immune Support",
+        features=[
+            "5000 IU Vitamin D3 per serving",
+            "Organic, non-GMO ingredients",
+            "Great-tasting natural berry flavor"
+        ],
+        target_audience="Health-conscious adults 30-55",
+        keywords=["vitamin d gummies", "immune support", "organic vitamins"],
+        intents={
+            "vitamin d gummies": ["durability", "style"],
+            "immune support": ["problem_solution", "use_case"],
+            "organic vitamins": ["style"]
+        }
+    )
+
+
+@pytest.fixture(scope="session")
+def fitness_context():
+    """Fitness product context for testing (shared, so frozen against mutation)"""
+    return _frozen_context(
+        title="Pro Resistance Bands Set - Heavy Duty Workout Kit",
+        features=[
+            "Military-grade latex construction",
+            "5 resistance levels (5-150 lbs)",
+            "Complete home gym replacement"
+        ],
+        target_audience="Fitness enthusiasts 25-45",
+        keywords=["resistance bands", "workout bands", "home gym"],
+        intents={
+            "resistance bands": ["durability", "comparison"],
+            "workout bands": ["use_case"],
+            "home gym": ["problem_solution"]
+        }
+    )
+
+
+@pytest.fixture(scope="session")
+def prompt_engine():
+    """Get prompt engine instance"""
+    return get_prompt_engine()
@@ -3,28 +3,25 @@ import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import AsyncMock
 
-from app.main import app
 from app.core.auth import User, get_current_user
-from app.db.session import engine, SessionLocal
-from app.models.database import Base, GenerationSession, UserSettings
+from app.models.database import GenerationSession, UserSettings
 from app.services.amazon_auth_service import AmazonAuthService, AmazonConnection
 from app.services.amazon_sp_api_service import AmazonSPAPIService
 from app.config import settings
-from app.api.endpoints import amazon as amazon_endpoints
 
 
 TEST_USER = User(id="user-test-123", email="test@example.com", role="authenticated")
 
 
-@pytest.fixture(scope="function")
-def client():
-    Base.metadata.create_all(bind=engine)
+@pytest.fixture(scope="module")
+def _client(app):
+    """Module TestClient authenticated as TEST_USER"""
     app.dependency_overrides[get_current_user] = lambda: TEST_USER
     try:
-        yield TestClient(app)
+        with TestClient(app) as test_client:
+            yield test_client
     finally:
         app.dependency_overrides.pop(get_current_user, None)
-        Base.metadata.drop_all(bind=engine)
 
 
 def test_amazon_auth_status_disconnected(client):
@@ -49,17 +46,13 @@ def test_amazon_auth_url_generation(client, monkeypatch):
     assert payload["state"]
 
 
-def test_amazon_auth_callback_success_redirect(client, monkeypatch):
-    db = SessionLocal()
-    try:
-        state = AmazonAuthService(db).create_signed_state(
-            user_id=TEST_USER.id,
-            marketplace_id="ATVPDKIKX0DER",
-            return_to="/app/settings",
-            expires_in_seconds=600,
-        )
-    finally:
-        db.close()
+def test_amazon_auth_callback_success_redirect(client, db_session, monkeypatch):
+    state = AmazonAuthService(db_session).create_signed_state(
+        user_id=TEST_USER.id,
+        marketplace_id="ATVPDKIKX0DER",
+        return_to="/app/settings",
+        expires_in_seconds=600,
+    )
 
     exchange_mock = AsyncMock(return_value={"refresh_token": "refresh-token-123"})
     save_calls = []
@@ -97,11 +90,11 @@ def test_amazon_auth_callback_success_redirect(client, monkeypatch):
     assert save_calls[0]["seller_id"] == "A1SELLER123"
 
 
-def test_listing_push_creates_job_and_status_available(client, monkeypatch):
+def test_listing_push_creates_job_and_status_available(client, db_session, monkeypatch):
     async def noop_background(job_id: str):
         return None
 
-    monkeypatch.setattr(amazon_endpoints, "_run_listing_push_job", noop_background)
+    monkeypatch.setattr("app.api.endpoints.amazon._run_listing_push_job", noop_background)
 
     def fake_get_connection(self, user_id):
         return AmazonConnection(
@@ -114,19 +107,15 @@ def test_listing_push_creates_job_and_status_available(client, monkeypatch):
 
     monkeypatch.setattr(AmazonAuthService, "get_connection", fake_get_connection)
 
-    db = SessionLocal()
-    try:
-        db.add(
-            GenerationSession(
-                id="session-123",
-                user_id=TEST_USER.id,
-                upload_path="supabase://uploads/sample.png",
-                product_title="Test Product",
-            )
+    db_session.add(
+        GenerationSession(
+            id="session-123",
+            user_id=TEST_USER.id,
+            upload_path="supabase://uploads/sample.png",
+            product_title="Test Product",
         )
-        db.commit()
-    finally:
-        db.close()
+    )
+    db_session.commit()
 
     response = client.post(
         "/api/amazon/push/listing-images",
@@ -149,11 +138,11 @@ def test_listing_push_creates_job_and_status_available(client, monkeypatch):
     assert status_payload["kind"] == "listing_images"
 
 
-def test_listing_push_accepts_sku_without_asin(client, monkeypatch):
+def test_listing_push_accepts_sku_without_asin(client, db_session, monkeypatch):
     async def noop_background(job_id: str):
         return None
 
-    monkeypatch.setattr(amazon_endpoints, "_run_listing_push_job", noop_background)
+    monkeypatch.setattr("app.api.endpoints.amazon._run_listing_push_job", noop_background)
 
     def fake_get_connection(self, user_id):
         return AmazonConnection(
@@ -166,19 +155,15 @@ def test_listing_push_accepts_sku_without_asin(client, monkeypatch):
 
     monkeypatch.setattr(AmazonAuthService, "get_connection", fake_get_connection)
 
-    db = SessionLocal()
-    try:
-        db.add(
-            GenerationSession(
-                id="session-123",
-                user_id=TEST_USER.id,
-                upload_path="supabase://uploads/sample.png",
-                product_title="Test Product",
-            )
+    db_session.add(
+        GenerationSession(
+            id="session-123",
+            user_id=TEST_USER.id,
+            upload_path="supabase://uploads/sample.png",
+            product_title="Test Product",
         )
-        db.commit()
-    finally:
-        db.close()
+    )
+    db_session.commit()
 
     response = client.post(
         "/api/amazon/push/listing-images",
@@ -199,34 +184,26 @@ def test_listing_push_accepts_sku_without_asin(client, monkeypatch):
     assert status_payload["sku"] == "MY-SKU-ONLY"
 
 
-def test_disconnect_clears_saved_connection(client):
-    db = SessionLocal()
-    try:
-        row = UserSettings(
-            user_id=TEST_USER.id,
-            email=TEST_USER.email,
-            amazon_refresh_token_encrypted="encrypted-token",
-            amazon_seller_id="A1SELLER123",
-            amazon_marketplace_id="ATVPDKIKX0DER",
-        )
-        db.add(row)
-        db.commit()
-    finally:
-        db.close()
+def test_disconnect_clears_saved_connection(client, db_session):
+    row = UserSettings(
+        user_id=TEST_USER.id,
+        email=TEST_USER.email,
+        amazon_refresh_token_encrypted="encrypted-token",
+        amazon_seller_id="A1SELLER123",
+        amazon_marketplace_id="ATVPDKIKX0DER",
+    )
+    db_session.add(row)
+    db_session.commit()
 
     response = client.delete("/api/amazon/auth/disconnect")
     assert response.status_code == 200
     assert response.json()["disconnected"] is True
 
-    db = SessionLocal()
-    try:
-        saved = db.query(UserSettings).filter(UserSettings.user_id == TEST_USER.id).first()
-        assert saved is not None
-        assert saved.amazon_refresh_token_encrypted is None
-        assert saved.amazon_seller_id is None
-        assert saved.amazon_marketplace_id is None
-    finally:
-        db.close()
+    saved = db_session.query(UserSettings).filter(UserSettings.user_id == TEST_USER.id).first()
+    assert saved is not None
+    assert saved.amazon_refresh_token_encrypted is None
+    assert saved.amazon_seller_id is None
+    assert saved.amazon_marketplace_id is None
 
 
 def test_list_skus_endpoint(client, monkeypatch):
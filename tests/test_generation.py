@@ -2,14 +2,16 @@
 Tests for Image Generation API Endpoints
 """
 import asyncio
+import copy
+from types import SimpleNamespace
+
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import AsyncMock, MagicMock, patch
+from unittest.mock import AsyncMock, patch
 from PIL import Image
 from urllib.parse import quote
 
 from app.dependencies import get_storage_service
-from app.main import app
 from app.core.auth import User, get_current_user
 from app.schemas.generation import (
     GenerationRequest,
@@ -17,8 +19,8 @@ from app.schemas.generation import (
     ImageTypeEnum,
     GenerationStatusEnum,
 )
-from app.models.database import Base, GenerationSession
-from app.db.session import engine, SessionLocal
+from app.models.database import GenerationSession, PromptHistory, ImageTypeEnum as DBImageTypeEnum
+from app.services.generation_service import GenerationService, RetryConfig
 
 
 class DummyStorageService:
@@ -62,8 +64,7 @@ class LegacyAplusStorageService(DummyStorageService):
     def __init__(self, names):
         self.generated_bucket = "generated"
         self.uploads_bucket = "uploads"
-        self.client = MagicMock()
-        self.client.storage = _LegacyStorageAPI(names)
+        self.client = SimpleNamespace(storage=_LegacyStorageAPI(names))
         self.saved_calls = []
 
     def get_generated_url(self, session_id, image_type, expires_in=3600):
@@ -80,27 +81,88 @@ class LegacyAplusStorageService(DummyStorageService):
         return f"supabase://generated/{session_id}/{image_type}.png"
 
 
-@pytest.fixture(scope="function")
-def client():
-    """Create test client with fresh database"""
-    Base.metadata.create_all(bind=engine)
-    app.dependency_overrides[get_storage_service] = lambda: DummyStorageService()
-    app.dependency_overrides[get_current_user] = lambda: User(
-        id="user-test-123",
-        email="test@example.com",
-        role="authenticated",
-    )
+# Stateless stand-ins shared by every request handled through the test client.
+DUMMY_STORAGE = DummyStorageService()
+TEST_USER = User(id="user-test-123", email="test@example.com", role="authenticated")
+
+# Raw storage paths and their URL-encoded image-proxy equivalents.
+STYLE_REF_PATH = "supabase://uploads/style-ref-123.png"
+STYLE_REF_PROXY_URL = f"/api/images/file?path={quote(STYLE_REF_PATH, safe='')}"
+FOCUS_STYLE_REF_PATH = "supabase://uploads/style-reference-main.png"
+FOCUS_STYLE_REF_PROXY_URL = f"/api/images/file?path={quote(FOCUS_STYLE_REF_PATH, safe='')}"
+
+
+class _FakeGemini:
+    """Gemini stand-in; tests attach AsyncMocks only where they assert on awaits."""
+
+    model = "gemini-test-model"
+
+
+# Shared by tests that never attach awaitables to the Gemini stand-in.
+FAKE_GEMINI = _FakeGemini()
+
+
+class _FakePromptEngine:
+    """Prompt engine stub that returns a fixed prompt (or raises a fixed error)."""
+
+    def __init__(self, prompt="Focus reference stress-test prompt.", error=None):
+        self.prompt = prompt
+        self.error = error
+
+    def build_prompt(self, image_type, context, style_override=None):
+        if self.error is not None:
+            raise self.error
+        return self.prompt
+
+
+class _FakeQueryDB:
+    """DB stub where query(...).filter(...).first() returns a fixed row."""
+
+    def __init__(self, first=None):
+        self._first = first
+
+    def query(self, *entities):
+        return SimpleNamespace(filter=lambda *criteria: SimpleNamespace(first=lambda: self._first))
+
+
+def _images_by_type(session):
+    """Index a session's image records by image type."""
+    return {img.image_type: img for img in session.images}
+
+
+def _seed_prompts(db, context, image_type, texts):
+    """
+    Insert consecutive prompt-history versions with a single flush.
+
+    store_prompt_in_history() counts, commits and refreshes per call; tests that
+    only need pre-existing history rows skip that and write them in one batch.
+    """
+    db.add_all([
+        PromptHistory(context_id=context.id, image_type=image_type, version=version, prompt_text=text)
+        for version, text in enumerate(texts, start=1)
+    ])
+    db.flush()
+
+
+@pytest.fixture(scope="module")
+def _client(app):
+    """Module TestClient with the stateless storage and auth stubs installed.
+
+    Installed once per module; the conftest ``client`` swaps in the per-test DB session.
+    """
+    app.dependency_overrides[get_storage_service] = lambda: DUMMY_STORAGE
+    app.dependency_overrides[get_current_user] = lambda: TEST_USER
     try:
-        yield TestClient(app)
+        with TestClient(app) as test_client:
+            yield test_client
     finally:
         app.dependency_overrides.pop(get_storage_service, None)
         app.dependency_overrides.pop(get_current_user, None)
-        Base.metadata.drop_all(bind=engine)
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def sample_request():
-    """Sample generation request"""
+    """Sample generation request (shared by the module, so tests must not mutate it)"""
     return {
         "product_title": "Organic Vitamin D3 Gummies",
         "feature_1": "5000 IU per serving",
@@ -115,21 +177,77 @@ def sample_request():
     }
 
 
+@pytest.fixture(scope="module")
+def generation_request(sample_request):
+    """Validated GenerationRequest built once from sample_request (use model_copy to vary it)"""
+    return GenerationRequest(**sample_request)
+
+
+@pytest.fixture(autouse=True)
+def _shared_requests_unmutated(request):
+    """Check the module-shared requests after each test that uses them, so a mutation fails that test"""
+    shared = [name for name in ("sample_request", "generation_request") if name in request.fixturenames]
+    originals = {name: copy.deepcopy(request.getfixturevalue(name)) for name in shared}
+    yield
+    for name, original in originals.items():
+        assert request.getfixturevalue(name) == original, f"this test mutated the shared {name}"
+
+
 @pytest.fixture
+def gen_service(db_session):
+    """GenerationService wired to stub Gemini/storage for service-level tests"""
+    return GenerationService(db=db_session, gemini=FAKE_GEMINI, storage=DUMMY_STORAGE)
+
+
+@pytest.fixture
+def created_session(gen_service, generation_request):
+    """Session created from the sample request, rolled back with db_session"""
+    return gen_service.create_session(generation_request)
+
+
+@pytest.fixture
+def aplus_history_session(gen_service, generation_request):
+    """Session with a design context holding two desktop and one mobile APLUS_3 prompt"""
+    session = gen_service.create_session(generation_request, user_id=TEST_USER.id)
+    context = gen_service.create_design_context(session)
+
+    _seed_prompts(gen_service.db, context, DBImageTypeEnum.APLUS_3, [
+        "Desktop prompt v1",
+        "[MOBILE RECOMPOSE] Mobile prompt v1",
+        "Desktop prompt v2",
+    ])
+
+    return gen_service, session, context
+
+
+@pytest.fixture(scope="module")
+def bare_service():
+    """GenerationService without __init__ wiring, for pure helper methods"""
+    return GenerationService.__new__(GenerationService)
+
+
+@pytest.fixture(scope="module")
+def loop():
+    """One event loop for the module instead of a fresh loop per asyncio.run()"""
+    new_loop = asyncio.new_event_loop()
+    yield new_loop
+    new_loop.close()
+
+
+@pytest.fixture(scope="session")
 def mock_pil_image():
-    """Create a mock PIL image for testing"""
-    img = Image.new('RGB', (2000, 2000), color='white')
+    """Create a mock PIL image for testing (tests never inspect pixels, so keep it tiny)"""
+    img = Image.new('RGB', (16, 16), color='white')
     return img
 
 
 class TestGenerationSchemas:
     """Tests for generation request/response schemas"""
 
-    def test_generation_request_valid(self, sample_request):
+    def test_generation_request_valid(self, generation_request, sample_request):
         """Test valid generation request"""
-        request = GenerationRequest(**sample_request)
-        assert request.product_title == sample_request["product_title"]
-        assert len(request.keywords) == 2
+        assert generation_request.product_title == sample_request["product_title"]
+        assert len(generation_request.keywords) == 2
 
     def test_generation_request_with_empty_keywords(self):
         """Test request with no keywords"""
@@ -162,14 +280,10 @@ class TestGenerationSchemas:
 class TestGenerationEndpoints:
     """Tests for generation API endpoints"""
 
-    def test_generation_endpoint_exists(self, client):
+    def test_generation_endpoint_exists(self, registered_paths):
         """Test that generation endpoints are registered"""
-        # Check OpenAPI spec includes generation endpoints
-        response = client.get("/openapi.json")
-        assert response.status_code == 200
-        paths = response.json()["paths"]
-        assert "/api/generate/" in paths
-        assert "/api/generate/{session_id}" in paths
+        assert "/api/generate/" in registered_paths
+        assert "/api/generate/{session_id}" in registered_paths
 
     @patch('app.services.gemini_service.GeminiService.generate_image')
     def test_start_generation_creates_session(
@@ -211,508 +325,396 @@ class TestGenerationEndpoints:
         )
         assert response.status_code == 404
 
-    def test_get_image_prompt_supports_desktop_mobile_tracks(self, client, sample_request):
+    def test_get_image_prompt_supports_desktop_mobile_tracks(self, client, aplus_history_session):
         """A+ prompt endpoint should return track-scoped versions for desktop/mobile."""
-        from app.services.generation_service import GenerationService
-        from app.schemas.generation import GenerationRequest
-        from app.models.database import ImageTypeEnum as DBImageTypeEnum
-
-        db = SessionLocal()
-        try:
-            gemini = MagicMock()
-            gemini.model = "gemini-test-model"
-            storage = DummyStorageService()
-            service = GenerationService(db=db, gemini=gemini, storage=storage)
-
-            request = GenerationRequest(**sample_request)
-            session = service.create_session(request, user_id="user-test-123")
-            context = service.create_design_context(session)
-
-            service.store_prompt_in_history(context, DBImageTypeEnum.APLUS_3, "Desktop prompt v1")
-            service.store_prompt_in_history(context, DBImageTypeEnum.APLUS_3, "[MOBILE RECOMPOSE] Mobile prompt v1")
-            service.store_prompt_in_history(context, DBImageTypeEnum.APLUS_3, "Desktop prompt v2")
-
-            desktop_resp = client.get(
-                f"/api/generate/{session.id}/prompts/aplus_3",
-                params={"track": "desktop", "version": 2},
-            )
-            assert desktop_resp.status_code == 200
-            desktop_data = desktop_resp.json()
-            assert desktop_data["prompt_text"] == "Desktop prompt v2"
-            assert desktop_data["version"] == 2
-
-            mobile_resp = client.get(
-                f"/api/generate/{session.id}/prompts/aplus_3",
-                params={"track": "mobile", "version": 1},
-            )
-            assert mobile_resp.status_code == 200
-            mobile_data = mobile_resp.json()
-            assert mobile_data["prompt_text"] == "[MOBILE RECOMPOSE] Mobile prompt v1"
-            assert mobile_data["version"] == 1
-        finally:
-            db.close()
+        _, session, _ = aplus_history_session
+
+        desktop_resp = client.get(
+            f"/api/generate/{session.id}/prompts/aplus_3",
+            params={"track": "desktop", "version": 2},
+        )
+        assert desktop_resp.status_code == 200
+        desktop_data = desktop_resp.json()
+        assert desktop_data["prompt_text"] == "Desktop prompt v2"
+        assert desktop_data["version"] == 2
+
+        mobile_resp = client.get(
+            f"/api/generate/{session.id}/prompts/aplus_3",
+            params={"track": "mobile", "version": 1},
+        )
+        assert mobile_resp.status_code == 200
+        mobile_data = mobile_resp.json()
+        assert mobile_data["prompt_text"] == "[MOBILE RECOMPOSE] Mobile prompt v1"
+        assert mobile_data["version"] == 1
 
 
 class TestGenerationService:
     """Tests for GenerationService business logic"""
 
-    def test_create_session_from_request(self, client, sample_request):
+    def test_create_session_from_request(self, created_session, generation_request):
         """Test session creation from request"""
-        from app.services.generation_service import GenerationService
-        from app.schemas.generation import GenerationRequest
-
-        db = SessionLocal()
-        try:
-            gemini = MagicMock()
-            storage = DummyStorageService()
-            service = GenerationService(db=db, gemini=gemini, storage=storage)
-
-            request = GenerationRequest(**sample_request)
-            session = service.create_session(request)
-
-            assert session.id is not None
-            assert session.product_title == sample_request["product_title"]
-            assert len(session.keywords) == 2
-            assert len(session.images) == 6
-
-            # Check all image types created
-            image_types = {img.image_type.value for img in session.images}
-            assert "main" in image_types
-            assert "infographic_1" in image_types
-            assert "infographic_2" in image_types
-            assert "lifestyle" in image_types
-            assert "transformation" in image_types
-            assert "comparison" in image_types
-
-        finally:
-            db.close()
-
-    def test_get_session_status(self, client, sample_request):
+        session = created_session
+
+        assert session.id is not None
+        assert session.product_title == generation_request.product_title
+        assert len(session.keywords) == 2
+        assert len(session.images) == 6
+
+        # Check all image types created
+        image_types = {img.image_type.value for img in session.images}
+        assert "main" in image_types
+        assert "infographic_1" in image_types
+        assert "infographic_2" in image_types
+        assert "lifestyle" in image_types
+        assert "transformation" in image_types
+        assert "comparison" in image_types
+
+    def test_get_session_status(self, gen_service, created_session):
         """Test retrieving session status"""
-        from app.services.generation_service import GenerationService
-        from app.schemas.generation import GenerationRequest
-
-        db = SessionLocal()
-        try:
-            gemini = MagicMock()
-            storage = DummyStorageService()
-            service = GenerationService(db=db, gemini=gemini, storage=storage)
+        retrieved = gen_service.get_session_status(created_session.id)
+        assert retrieved is not None
+        assert retrieved.id == created_session.id
 
-            request = GenerationRequest(**sample_request)
-            session = service.create_session(request)
-
-            # Retrieve session
-            retrieved = service.get_session_status(session.id)
-            assert retrieved is not None
-            assert retrieved.id == session.id
-
-        finally:
-            db.close()
-
-    def test_get_session_results(self, client, sample_request):
+    def test_get_session_results(self, gen_service, created_session):
         """Test getting session image results"""
-        from app.services.generation_service import GenerationService
-        from app.schemas.generation import GenerationRequest
-
-        db = SessionLocal()
-        try:
-            gemini = MagicMock()
-            storage = DummyStorageService()
-            service = GenerationService(db=db, gemini=gemini, storage=storage)
-
-            request = GenerationRequest(**sample_request)
-            session = service.create_session(request)
-
-            results = service.get_session_results(session)
-            assert len(results) == 6
-            for result in results:
-                assert result.status.value == "pending"
-
-        finally:
-            db.close()
+        results = gen_service.get_session_results(created_session)
+        assert len(results) == 6
+        for result in results:
+            assert result.status.value == "pending"
 
     @patch("app.services.vision_service.get_vision_service")
     def test_edit_aplus_uses_versioned_fallback_when_canonical_missing(
         self,
         mock_get_vision_service,
-        client,
-        sample_request,
+        db_session,
+        generation_request,
+        loop,
     ):
         """Test A+ edit fallback to latest versioned image when canonical key is missing."""
-        from app.services.generation_service import GenerationService
-        from app.schemas.generation import GenerationRequest
-        from app.models.database import ImageTypeEnum as DBImageTypeEnum
-
-        vision = MagicMock()
-        vision.plan_edit_instructions = AsyncMock(
-            return_value={
-                "interpretation": "Increase headline emphasis while preserving layout",
-                "changes_made": ["Text emphasis update"],
-                "edit_instructions": "Increase headline size and weight; keep all other elements unchanged.",
-            }
+        vision = SimpleNamespace(
+            plan_edit_instructions=AsyncMock(
+                return_value={
+                    "interpretation": "Increase headline emphasis while preserving layout",
+                    "changes_made": ["Text emphasis update"],
+                    "edit_instructions": "Increase headline size and weight; keep all other elements unchanged.",
+                }
+            )
         )
         mock_get_vision_service.return_value = vision
 
-        db = SessionLocal()
-        try:
-            gemini = MagicMock()
-            gemini.model = "gemini-test-model"
-            gemini.edit_image = AsyncMock(return_value=Image.new("RGB", (1464, 600), color="white"))
+        gemini = _FakeGemini()
+        gemini.edit_image = AsyncMock(return_value=Image.new("RGB", (8, 8), color="white"))
 
-            storage = LegacyAplusStorageService(
-                names=["aplus_full_image_0_v3.png", "aplus_full_image_1_v3.png"]
-            )
-            service = GenerationService(db=db, gemini=gemini, storage=storage)
+        storage = LegacyAplusStorageService(
+            names=["aplus_full_image_0_v3.png", "aplus_full_image_1_v3.png"]
+        )
+        service = GenerationService(db=db_session, gemini=gemini, storage=storage)
 
-            request = GenerationRequest(**sample_request)
-            session = service.create_session(request)
+        session = service.create_session(generation_request)
 
-            result = asyncio.run(
-                service.edit_single_image(
-                    session=session,
-                    image_type=DBImageTypeEnum.APLUS_0,
-                    edit_instructions="Make headline text larger and bolder.",
-                )
+        result = loop.run_until_complete(
+            service.edit_single_image(
+                session=session,
+                image_type=DBImageTypeEnum.APLUS_0,
+                edit_instructions="Make headline text larger and bolder.",
             )
+        )
 
-            assert result.status.value == "complete"
-            assert result.storage_path.endswith("/aplus_full_image_0.png")
-            assert gemini.edit_image.await_count == 1
-            source_path = gemini.edit_image.await_args.kwargs["source_image_path"]
-            applied_edit_instructions = gemini.edit_image.await_args.kwargs["edit_instructions"]
-            assert source_path.endswith("/aplus_full_image_0_v3.png")
-            assert "Increase headline size and weight" in applied_edit_instructions
-            vision.plan_edit_instructions.assert_awaited_once()
-            assert storage.saved_calls[0]["image_type"] == "aplus_full_image_0"
-        finally:
-            db.close()
+        assert result.status.value == "complete"
+        assert result.storage_path.endswith("/aplus_full_image_0.png")
+        assert gemini.edit_image.await_count == 1
+        source_path = gemini.edit_image.await_args.kwargs["source_image_path"]
+        applied_edit_instructions = gemini.edit_image.await_args.kwargs["edit_instructions"]
+        assert source_path.endswith("/aplus_full_image_0_v3.png")
+        assert "Increase headline size and weight" in applied_edit_instructions
+        vision.plan_edit_instructions.assert_awaited_once()
+        assert storage.saved_calls[0]["image_type"] == "aplus_full_image_0"
 
     @patch("app.services.vision_service.get_vision_service")
     def test_regenerate_with_note_fails_when_ai_designer_unavailable(
         self,
         mock_get_vision_service,
-        client,
-        sample_request,
+        db_session,
+        generation_request,
         mock_pil_image,
+        loop,
     ):
         """Regen with note must fail if AI Designer rewrite is unavailable."""
-        from app.services.generation_service import GenerationService
-        from app.schemas.generation import GenerationRequest
-        from app.models.database import ImageTypeEnum as DBImageTypeEnum
+        async def _vision_unavailable(**kwargs):
+            raise ValueError("Vision client not initialized")
 
-        failing_vision = MagicMock()
-        failing_vision.enhance_prompt_with_feedback = AsyncMock(
-            side_effect=ValueError("Vision client not initialized")
-        )
+        failing_vision = SimpleNamespace(enhance_prompt_with_feedback=_vision_unavailable)
         mock_get_vision_service.return_value = failing_vision
 
-        db = SessionLocal()
-        try:
-            gemini = MagicMock()
-            gemini.model = "gemini-test-model"
-            gemini.generate_image = AsyncMock(return_value=mock_pil_image)
-            storage = DummyStorageService()
-            prompt_engine = MagicMock()
-            prompt_engine.build_prompt.return_value = "Focus reference stress-test prompt."
-            service = GenerationService(
-                db=db,
-                gemini=gemini,
-                storage=storage,
-                prompt_engine=prompt_engine,
-            )
+        gemini = _FakeGemini()
+        gemini.generate_image = AsyncMock(return_value=mock_pil_image)
+        prompt_engine = _FakePromptEngine()
+        service = GenerationService(
+            db=db_session,
+            gemini=gemini,
+            storage=DUMMY_STORAGE,
+            prompt_engine=prompt_engine,
+        )
 
-            request = GenerationRequest(**sample_request)
-            session = service.create_session(request)
+        session = service.create_session(generation_request)
 
-            with pytest.raises(RuntimeError, match="AI Designer could not rewrite"):
-                asyncio.run(
-                    service.generate_single_image(
-                        session=session,
-                        image_type=DBImageTypeEnum.MAIN,
-                        note="Make the scene brighter and cleaner.",
-                    )
+        with pytest.raises(RuntimeError, match="AI Designer could not rewrite"):
+            loop.run_until_complete(
+                service.generate_single_image(
+                    session=session,
+                    image_type=DBImageTypeEnum.MAIN,
+                    note="Make the scene brighter and cleaner.",
                 )
-            assert gemini.generate_image.await_count == 0
-        finally:
-            db.close()
+            )
+        assert gemini.generate_image.await_count == 0
 
     @patch("app.services.vision_service.get_vision_service")
     def test_regenerate_with_note_uses_ai_rewrite_without_raw_injection(
         self,
         mock_get_vision_service,
-        client,
-        sample_request,
+        db_session,
+        generation_request,
         mock_pil_image,
+        loop,
     ):
         """Regen with feedback should use AI rewrite and avoid raw feedback injection."""
-        from app.services.generation_service import GenerationService
-        from app.schemas.generation import GenerationRequest
-        from app.models.database import ImageTypeEnum as DBImageTypeEnum
-
-        vision = MagicMock()
-        vision.enhance_prompt_with_feedback = AsyncMock(
-            return_value={
-                "interpretation": "Removed banned wording and cleaned copy",
-                "changes_made": ["Adjusted headline copy"],
-                "enhanced_prompt": (
-                    "A refined scene prompt without banned terms.\n\n"
-                    "LIGHTING OVERRIDE: Old duplicate block from prior run."
-                ),
-            }
+        vision = SimpleNamespace(
+            enhance_prompt_with_feedback=AsyncMock(
+                return_value={
+                    "interpretation": "Removed banned wording and cleaned copy",
+                    "changes_made": ["Adjusted headline copy"],
+                    "enhanced_prompt": (
+                        "A refined scene prompt without banned terms.\n\n"
+                        "LIGHTING OVERRIDE: Old duplicate block from prior run."
+                    ),
+                }
+            )
         )
         mock_get_vision_service.return_value = vision
 
-        db = SessionLocal()
-        try:
-            gemini = MagicMock()
-            gemini.model = "gemini-test-model"
-            gemini.generate_image = AsyncMock(return_value=mock_pil_image)
-            storage = DummyStorageService()
-            prompt_engine = MagicMock()
-            prompt_engine.build_prompt.return_value = "Focus reference stress-test prompt."
-            service = GenerationService(
-                db=db,
-                gemini=gemini,
-                storage=storage,
-                prompt_engine=prompt_engine,
-            )
+        gemini = _FakeGemini()
+        gemini.generate_image = AsyncMock(return_value=mock_pil_image)
+        prompt_engine = _FakePromptEngine()
+        service = GenerationService(
+            db=db_session,
+            gemini=gemini,
+            storage=DUMMY_STORAGE,
+            prompt_engine=prompt_engine,
+        )
 
-            request = GenerationRequest(**sample_request)
-            session = service.create_session(request)
+        session = service.create_session(generation_request)
 
-            result = asyncio.run(
-                service.generate_single_image(
-                    session=session,
-                    image_type=DBImageTypeEnum.MAIN,
-                    note='Do not use the word "dopamine".',
-                )
+        result = loop.run_until_complete(
+            service.generate_single_image(
+                session=session,
+                image_type=DBImageTypeEnum.MAIN,
+                note='Do not use the word "dopamine".',
             )
+        )
 
-            assert result.status.value == "complete"
-            assert gemini.generate_image.await_count == 1
-            sent_prompt = gemini.generate_image.await_args.kwargs["prompt"]
-            assert "USER FEEDBACK TO APPLY" not in sent_prompt
-            assert sent_prompt.lower().count("lighting override:") == 1
+        assert result.status.value == "complete"
+        assert gemini.generate_image.await_count == 1
+        sent_prompt = gemini.generate_image.await_args.kwargs["prompt"]
+        assert "USER FEEDBACK TO APPLY" not in sent_prompt
+        assert sent_prompt.lower().count("lighting override:") == 1
 
-            rewrite_input = vision.enhance_prompt_with_feedback.await_args.kwargs["original_prompt"]
-            assert "USER FEEDBACK TO APPLY" not in rewrite_input
-            assert "lighting override:" not in rewrite_input.lower()
-        finally:
-            db.close()
+        rewrite_input = vision.enhance_prompt_with_feedback.await_args.kwargs["original_prompt"]
+        assert "USER FEEDBACK TO APPLY" not in rewrite_input
+        assert "lighting override:" not in rewrite_input.lower()
 
-    def test_generate_single_preflight_failure_does_not_mark_processing(self, client, sample_request):
+    def test_generate_single_preflight_failure_does_not_mark_processing(
+        self,
+        db_session,
+        generation_request,
+        loop,
+    ):
         """If preflight prompt construction fails, image status must not get stuck in processing."""
-        from app.services.generation_service import GenerationService
-        from app.schemas.generation import GenerationRequest
-        from app.models.database import ImageTypeEnum as DBImageTypeEnum
-
-        db = SessionLocal()
-        try:
-            gemini = MagicMock()
-            gemini.model = "gemini-test-model"
-            storage = DummyStorageService()
-            service = GenerationService(db=db, gemini=gemini, storage=storage)
-
-            request = GenerationRequest(**sample_request)
-            session = service.create_session(request)
-
-            # Force a preflight failure before processing state is set.
-            service.prompt_engine.build_prompt = MagicMock(side_effect=ValueError("preflight prompt failure"))
-
-            with pytest.raises(ValueError, match="preflight prompt failure"):
-                asyncio.run(
-                    service.generate_single_image(
-                        session=session,
-                        image_type=DBImageTypeEnum.MAIN,
-                        note=None,
-                    )
+        # Force a preflight failure before processing state is set.
+        prompt_engine = _FakePromptEngine(error=ValueError("preflight prompt failure"))
+        service = GenerationService(
+            db=db_session,
+            gemini=FAKE_GEMINI,
+            storage=DUMMY_STORAGE,
+            prompt_engine=prompt_engine,
+        )
+
+        session = service.create_session(generation_request)
+
+        with pytest.raises(ValueError, match="preflight prompt failure"):
+            loop.run_until_complete(
+                service.generate_single_image(
+                    session=session,
+                    image_type=DBImageTypeEnum.MAIN,
+                    note=None,
                 )
+            )
 
-            main_record = next(img for img in session.images if img.image_type == DBImageTypeEnum.MAIN)
-            assert main_record.status.value == "pending"
-        finally:
-            db.close()
+        main_record = _images_by_type(session)[DBImageTypeEnum.MAIN]
+        assert main_record.status.value == "pending"
 
     def test_paths_match_handles_encoded_proxy_urls(self):
         """Path matcher should align proxy URLs with raw storage paths."""
-        from app.services.generation_service import GenerationService
-
-        raw_path = "supabase://uploads/style-ref-123.png"
-        proxy_path = f"/api/images/file?path={quote(raw_path, safe='')}"
-        assert GenerationService._paths_match(raw_path, proxy_path)
+        assert GenerationService._paths_match(STYLE_REF_PATH, STYLE_REF_PROXY_URL)
 
     def test_generate_single_focus_refs_restores_style_prefix_and_semantic_labels(
         self,
-        client,
-        sample_request,
+        db_session,
+        generation_request,
         mock_pil_image,
+        loop,
     ):
         """Focus-image generation should still identify style refs and additional product refs."""
-        from app.services.generation_service import GenerationService
-        from app.schemas.generation import GenerationRequest
-        from app.models.database import ImageTypeEnum as DBImageTypeEnum
-
-        db = SessionLocal()
-        try:
-            gemini = MagicMock()
-            gemini.model = "gemini-test-model"
-            gemini.generate_image = AsyncMock(return_value=mock_pil_image)
-            storage = DummyStorageService()
-            prompt_engine = MagicMock()
-            prompt_engine.build_prompt.return_value = "Focus reference stress-test prompt."
-            service = GenerationService(
-                db=db,
-                gemini=gemini,
-                storage=storage,
-                prompt_engine=prompt_engine,
-            )
+        async def _generate_image(**kwargs):
+            return mock_pil_image
+
+        gemini = _FakeGemini()
+        gemini.generate_image = _generate_image
+        prompt_engine = _FakePromptEngine()
+        service = GenerationService(
+            db=db_session,
+            gemini=gemini,
+            storage=DUMMY_STORAGE,
+            prompt_engine=prompt_engine,
+        )
 
-            payload = dict(sample_request)
-            payload["additional_upload_paths"] = [
-                "supabase://uploads/additional-a.png",
-                "supabase://uploads/additional-b.png",
-            ]
-            payload["style_reference_path"] = "supabase://uploads/style-reference-main.png"
-            payload["logo_path"] = "supabase://uploads/logo.png"
-            request = GenerationRequest(**payload)
-            session = service.create_session(request, user_id="user-test-123")
-            service.create_design_context(session)
-
-            style_proxy = f"/api/images/file?path={quote(session.style_reference_path, safe='')}"
-            focus_refs = [
-                session.upload_path,
-                style_proxy,
-                session.additional_upload_paths[0],
-            ]
-
-            result = asyncio.run(
-                service.generate_single_image(
-                    session=session,
-                    image_type=DBImageTypeEnum.INFOGRAPHIC_1,
-                    reference_image_paths=focus_refs,
-                )
+        request = generation_request.model_copy(
+            update={
+                "additional_upload_paths": [
+                    "supabase://uploads/additional-a.png",
+                    "supabase://uploads/additional-b.png",
+                ],
+                "style_reference_path": FOCUS_STYLE_REF_PATH,
+                "logo_path": "supabase://uploads/logo.png",
+            }
+        )
+        session = service.create_session(request, user_id=TEST_USER.id)
+        service.create_design_context(session)
+
+        style_proxy = FOCUS_STYLE_REF_PROXY_URL
+        focus_refs = [
+            session.upload_path,
+            style_proxy,
+            session.additional_upload_paths[0],
+        ]
+
+        result = loop.run_until_complete(
+            service.generate_single_image(
+                session=session,
+                image_type=DBImageTypeEnum.INFOGRAPHIC_1,
+                reference_image_paths=focus_refs,
             )
-            assert result.status.value == "complete"
+        )
+        assert result.status.value == "complete"
 
-            context = service.get_design_context(session.id)
-            latest = service.get_latest_prompt(context, DBImageTypeEnum.INFOGRAPHIC_1)
-            assert latest is not None
-            assert "=== STYLE REFERENCE ===" in latest.prompt_text
+        context = service.get_design_context(session.id)
+        latest = service.get_latest_prompt(context, DBImageTypeEnum.INFOGRAPHIC_1)
+        assert latest is not None
+        assert "=== STYLE REFERENCE ===" in latest.prompt_text
 
-            labels = [item.get("label") for item in (latest.reference_image_paths or [])]
-            assert "STYLE_REFERENCE" in labels
-            assert any((label or "").startswith("ADDITIONAL_PRODUCT_") for label in labels)
-        finally:
-            db.close()
+        labels = [item.get("label") for item in (latest.reference_image_paths or [])]
+        assert "STYLE_REFERENCE" in labels
+        assert any((label or "").startswith("ADDITIONAL_PRODUCT_") for label in labels)
 
-    def test_aplus_prompt_history_can_filter_out_mobile_entries(self, client, sample_request):
+    def test_aplus_prompt_history_can_filter_out_mobile_entries(self, aplus_history_session):
         """Desktop prompt track should ignore mobile recomposition entries."""
-        from app.services.generation_service import GenerationService
-        from app.schemas.generation import GenerationRequest
-        from app.models.database import ImageTypeEnum as DBImageTypeEnum
-
-        db = SessionLocal()
-        try:
-            gemini = MagicMock()
-            gemini.model = "gemini-test-model"
-            storage = DummyStorageService()
-            service = GenerationService(db=db, gemini=gemini, storage=storage)
-
-            request = GenerationRequest(**sample_request)
-            session = service.create_session(request, user_id="user-test-123")
-            context = service.create_design_context(session)
-
-            service.store_prompt_in_history(context, DBImageTypeEnum.APLUS_3, "Desktop prompt v1")
-            service.store_prompt_in_history(context, DBImageTypeEnum.APLUS_3, "[MOBILE RECOMPOSE] Mobile prompt v1")
-            service.store_prompt_in_history(context, DBImageTypeEnum.APLUS_3, "Desktop prompt v2")
-
-            desktop_history = service.get_prompt_history(
-                context,
-                DBImageTypeEnum.APLUS_3,
-                include_mobile=False,
-            )
-            assert [item.prompt_text for item in desktop_history] == [
-                "Desktop prompt v1",
-                "Desktop prompt v2",
-            ]
-
-            latest_desktop = service.get_latest_prompt(
-                context,
-                DBImageTypeEnum.APLUS_3,
-                include_mobile=False,
-            )
-            assert latest_desktop is not None
-            assert latest_desktop.prompt_text == "Desktop prompt v2"
-
-            version_two_desktop = service.get_prompt_by_version(
-                context,
-                DBImageTypeEnum.APLUS_3,
-                2,
-                include_mobile=False,
-            )
-            assert version_two_desktop is not None
-            assert version_two_desktop.prompt_text == "Desktop prompt v2"
-        finally:
-            db.close()
+        service, _, context = aplus_history_session
+
+        desktop_history = service.get_prompt_history(
+            context,
+            DBImageTypeEnum.APLUS_3,
+            include_mobile=False,
+        )
+        assert [item.prompt_text for item in desktop_history] == [
+            "Desktop prompt v1",
+            "Desktop prompt v2",
+        ]
+
+        latest_desktop = service.get_latest_prompt(
+            context,
+            DBImageTypeEnum.APLUS_3,
+            include_mobile=False,
+        )
+        assert latest_desktop is not None
+        assert latest_desktop.prompt_text == "Desktop prompt v2"
+
+        version_two_desktop = service.get_prompt_by_version(
+            context,
+            DBImageTypeEnum.APLUS_3,
+            2,
+            include_mobile=False,
+        )
+        assert version_two_desktop is not None
+        assert version_two_desktop.prompt_text == "Desktop prompt v2"
+
+    def test_seeded_prompt_history_matches_store_prompt_in_history(self, aplus_history_session):
+        """_seed_prompts must number versions exactly as the production write path does."""
+        service, _, context = aplus_history_session
+        seeded = service.db.query(PromptHistory).filter_by(
+            context_id=context.id, image_type=DBImageTypeEnum.APLUS_3
+        ).order_by(PromptHistory.version).all()
+
+        stored = [
+            service.store_prompt_in_history(context, DBImageTypeEnum.APLUS_4, row.prompt_text)
+            for row in seeded
+        ]
+        assert [(row.version, row.prompt_text) for row in stored] == [
+            (row.version, row.prompt_text) for row in seeded
+        ]
 
 
 class TestEffectiveBrandResolution:
     """Tests for effective brand name resolution in A+ prompt generation."""
 
-    def test_prefers_explicit_session_brand_when_not_product_title(self):
+    @pytest.fixture
+    def resolve_brand(self):
+        """The endpoint helper, imported here so the routers load only for these tests"""
         from app.api.endpoints.generation import _resolve_effective_brand_name
+        return _resolve_effective_brand_name
 
-        session = MagicMock()
-        session.brand_name = "Nebula Colors"
-        session.product_title = "Hanging Moon Planter"
-        session.user_id = "user-1"
+    def test_prefers_explicit_session_brand_when_not_product_title(self, resolve_brand):
+        session = SimpleNamespace(
+            brand_name="Nebula Colors",
+            product_title="Hanging Moon Planter",
+            user_id="user-1",
+        )
 
-        db = MagicMock()
-        db.query.return_value.filter.return_value.first.return_value = None
+        db = _FakeQueryDB(first=None)
 
-        resolved = _resolve_effective_brand_name(session, db, "user-1")
+        resolved = resolve_brand(session, db, "user-1")
         assert resolved == "Nebula Colors"
 
-    def test_uses_default_brand_when_session_brand_matches_product_title(self):
-        from app.api.endpoints.generation import _resolve_effective_brand_name
-
-        session = MagicMock()
-        session.brand_name = "Hanging Moon Planter"
-        session.product_title = "Hanging Moon Planter"
-        session.user_id = "user-1"
+    def test_uses_default_brand_when_session_brand_matches_product_title(self, resolve_brand):
+        session = SimpleNamespace(
+            brand_name="Hanging Moon Planter",
+            product_title="Hanging Moon Planter",
+            user_id="user-1",
+        )
 
-        settings = MagicMock()
-        settings.default_brand_name = "Nebula Colors"
-        db = MagicMock()
-        db.query.return_value.filter.return_value.first.return_value = settings
+        settings = SimpleNamespace(default_brand_name="Nebula Colors")
+        db = _FakeQueryDB(first=settings)
 
-        resolved = _resolve_effective_brand_name(session, db, "user-1")
+        resolved = resolve_brand(session, db, "user-1")
         assert resolved == "Nebula Colors"
 
-    def test_treats_brand_as_unspecified_when_it_only_repeats_product_title(self):
-        from app.api.endpoints.generation import _resolve_effective_brand_name
-
-        session = MagicMock()
-        session.brand_name = "Hanging Moon Planter"
-        session.product_title = "Hanging Moon Planter"
-        session.user_id = "user-1"
+    def test_treats_brand_as_unspecified_when_it_only_repeats_product_title(self, resolve_brand):
+        session = SimpleNamespace(
+            brand_name="Hanging Moon Planter",
+            product_title="Hanging Moon Planter",
+            user_id="user-1",
+        )
 
-        db = MagicMock()
-        db.query.return_value.filter.return_value.first.return_value = None
+        db = _FakeQueryDB(first=None)
 
-        resolved = _resolve_effective_brand_name(session, db, "user-1")
+        resolved = resolve_brand(session, db, "user-1")
         assert resolved == ""
 
 
 class TestAsyncGeneration:
     """Tests for async generation endpoint"""
 
-    def test_async_endpoint_exists(self, client):
+    def test_async_endpoint_exists(self, registered_paths):
         """Test that async generation endpoint is registered"""
-        response = client.get("/openapi.json")
-        assert response.status_code == 200
-        paths = response.json()["paths"]
-        assert "/api/generate/async" in paths
+        assert "/api/generate/async" in registered_paths
 
     @patch('app.services.generation_service.GenerationService.generate_all_images', new_callable=AsyncMock)
     def test_async_generation_returns_immediately(
@@ -737,54 +739,40 @@ class TestRetryLogic:
 
     def test_retry_config_values(self):
         """Test RetryConfig has correct values"""
-        from app.services.generation_service import RetryConfig
-
         assert RetryConfig.MAX_RETRIES == 3
         assert RetryConfig.BASE_DELAY == 1
         assert RetryConfig.MAX_DELAY == 8
         assert len(RetryConfig.VARIATIONS) >= 3
 
-    def test_retry_delay_calculation(self):
+    @pytest.mark.parametrize(
+        ("attempt", "expected"),
+        [
+            (0, 1),  # 1 * 2^0 = 1
+            (1, 2),  # 1 * 2^1 = 2
+            (2, 4),  # 1 * 2^2 = 4
+            (3, 8),  # capped at MAX_DELAY
+        ],
+    )
+    def test_retry_delay_calculation(self, bare_service, attempt, expected):
         """Test exponential backoff delay"""
-        from app.services.generation_service import GenerationService
-
-        # Create a mock service to test
-        service = GenerationService.__new__(GenerationService)
+        assert bare_service._get_retry_delay(attempt) == expected
 
-        assert service._get_retry_delay(0) == 1  # 1 * 2^0 = 1
-        assert service._get_retry_delay(1) == 2  # 1 * 2^1 = 2
-        assert service._get_retry_delay(2) == 4  # 1 * 2^2 = 4
-        assert service._get_retry_delay(3) == 8  # capped at MAX_DELAY
+    def test_first_attempt_uses_original_prompt(self, bare_service):
+        """First attempt uses original prompt (empty variation)"""
+        assert bare_service._get_prompt_variation(0) == ""
 
-    def test_prompt_variations(self):
-        """Test prompt variations are returned correctly"""
-        from app.services.generation_service import GenerationService, RetryConfig
+    @pytest.mark.parametrize("attempt", [1, 2])
+    def test_prompt_variations(self, bare_service, attempt):
+        """Subsequent attempts get prompt variations"""
+        assert "VARIATION" in bare_service._get_prompt_variation(attempt)
 
-        service = GenerationService.__new__(GenerationService)
-
-        # First attempt uses original prompt (empty variation)
-        assert service._get_prompt_variation(0) == ""
-
-        # Subsequent attempts get variations
-        assert "VARIATION" in service._get_prompt_variation(1)
-        assert "VARIATION" in service._get_prompt_variation(2)
-
-    def test_retry_endpoint_exists(self, client):
+    def test_retry_endpoint_exists(self, registered_paths):
         """Test retry endpoint is registered"""
-        response = client.get("/openapi.json")
-        assert response.status_code == 200
-        # Check for retry pattern in paths
-        paths = response.json()["paths"]
-        retry_paths = [p for p in paths if "retry" in p]
-        assert len(retry_paths) > 0
-
-    def test_stats_endpoint_exists(self, client):
+        assert any("retry" in p for p in registered_paths)
+
+    def test_stats_endpoint_exists(self, registered_paths):
         """Test stats endpoint is registered"""
-        response = client.get("/openapi.json")
-        assert response.status_code == 200
-        paths = response.json()["paths"]
-        stats_paths = [p for p in paths if "stats" in p]
-        assert len(stats_paths) > 0
+        assert any("stats" in p for p in registered_paths)
 
     def test_retry_session_not_found(self, client):
         """Test retry with non-existent session"""
@@ -796,33 +784,13 @@ class TestRetryLogic:
         response = client.get("/api/generate/nonexistent-id/stats")
         assert response.status_code == 404
 
-    def test_generation_stats_structure(self, client, sample_request):
+    def test_generation_stats_structure(self, gen_service, created_session):
         """Test generation stats return correct structure"""
-        from app.services.generation_service import GenerationService
-        from app.schemas.generation import GenerationRequest
-        from app.db.session import SessionLocal, engine
-        from app.models.database import Base
-
-        # Ensure tables exist (client fixture creates them)
-        Base.metadata.create_all(bind=engine)
-
-        db = SessionLocal()
-        try:
-            gemini = MagicMock()
-            storage = DummyStorageService()
-            service = GenerationService(db=db, gemini=gemini, storage=storage)
-
-            request = GenerationRequest(**sample_request)
-            session = service.create_session(request)
-
-            stats = service.get_generation_stats(session)
-
-            assert "session_id" in stats
-            assert "total_images" in stats
-            assert stats["total_images"] == 6
-            assert "by_status" in stats
-            assert "retry_counts" in stats
-            assert len(stats["retry_counts"]) == 6
-
-        finally:
-            db.close()
+        stats = gen_service.get_generation_stats(created_session)
+
+        assert "session_id" in stats
+        assert "total_images" in stats
+        assert stats["total_images"] == 6
+        assert "by_status" in stats
+        assert "retry_counts" in stats
+        assert len(stats["retry_counts"]) == 6
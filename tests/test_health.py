@@ -3,7 +3,6 @@ import pytest
 from fastapi.testclient import TestClient
 
 from app.dependencies import get_storage_service
-from app.main import app
 
 
 class DummyStorageService:
@@ -13,11 +12,13 @@ class DummyStorageService:
         return {"status": "accessible", "provider": "test"}
 
 
-@pytest.fixture(scope="function")
-def client():
+@pytest.fixture(scope="module")
+def client(app):
+    """One TestClient for the module; every test here is a stateless GET/OPTIONS"""
     app.dependency_overrides[get_storage_service] = lambda: DummyStorageService()
     try:
-        yield TestClient(app)
+        with TestClient(app) as test_client:
+            yield test_client
     finally:
         app.dependency_overrides.pop(get_storage_service, None)
 
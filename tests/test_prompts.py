@@ -1,7 +1,7 @@
 """
 Tests for Prompt Engineering System
 """
-import pytest
+from unittest.mock import patch
 from app.prompts import (
     PromptEngine,
     ProductContext,
@@ -12,53 +12,6 @@ from app.prompts import (
 )
 
 
-# Test fixtures
-@pytest.fixture
-def sample_context():
-    """Sample product context for testing"""
-    return ProductContext(
-        title="Organic Vitamin D3 Gummies - Natural Immune Support",
-        features=[
-            "5000 IU Vitamin D3 per serving",
-            "Organic, non-GMO ingredients",
-            "Great-tasting natural berry flavor"
-        ],
-        target_audience="Health-conscious adults 30-55",
-        keywords=["vitamin d gummies", "immune support", "organic vitamins"],
-        intents={
-            "vitamin d gummies": ["durability", "style"],
-            "immune support": ["problem_solution", "use_case"],
-            "organic vitamins": ["style"]
-        }
-    )
-
-
-@pytest.fixture
-def fitness_context():
-    """Fitness product context for testing"""
-    return ProductContext(
-        title="Pro Resistance Bands Set - Heavy Duty Workout Kit",
-        features=[
-            "Military-grade latex construction",
-            "5 resistance levels (5-150 lbs)",
-            "Complete home gym replacement"
-        ],
-        target_audience="Fitness enthusiasts 25-45",
-        keywords=["resistance bands", "workout bands", "home gym"],
-        intents={
-            "resistance bands": ["durability", "comparison"],
-            "workout bands": ["use_case"],
-            "home gym": ["problem_solution"]
-        }
-    )
-
-
-@pytest.fixture
-def prompt_engine():
-    """Get prompt engine instance"""
-    return get_prompt_engine()
-
-
 class TestPromptEngine:
     """Tests for PromptEngine class"""
 
@@ -141,6 +94,63 @@ class TestPromptEngine:
         # Main image prioritizes durability and style
         assert "DURABILITY INTENT" in prompt or "STYLE INTENT" in prompt or "professional" in prompt.lower()
 
+    def test_repeated_prompt_served_from_cache(self, sample_context):
+        """Test that re-rendering an identical context reuses the cached prompt"""
+        engine = PromptEngine()
+        with patch.object(engine, "_render_legacy_prompt", wraps=engine._render_legacy_prompt) as render:
+            first = engine.build_prompt('main', sample_context)
+            again = engine.build_prompt('main', ProductContext(**vars(sample_context)))
+        assert again is first
+        assert render.call_count == 1
+
+    def test_prompt_cache_tracks_context_changes(self, sample_context):
+        """Test that changing the context content yields a freshly rendered prompt"""
+        engine = PromptEngine()
+        engine.build_prompt('main', sample_context)
+
+        renamed = ProductContext(**{**vars(sample_context), "title": "Renamed Gummies"})
+        prompt = engine.build_prompt('main', renamed)
+        assert "Renamed Gummies" in prompt
+        assert sample_context.title not in prompt
+
+    def test_prompt_cache_key_covers_every_rendered_field(self, sample_context):
+        """Test that changing any field the legacy prompt reads yields a fresh prompt"""
+        changes = {
+            "title": "Renamed Gummies",
+            "features": ["2000 IU Vitamin D3 per serving", *sample_context.features[1:]],
+            "target_audience": "Seniors 65+",
+            "keywords": [*sample_context.keywords, "vitamin d3"],
+            "intents": {**sample_context.intents, "vitamin d gummies": ["comparison"]},
+            "brand_colors": ["#112233"],
+            "brand_name": "Sunny Labs",
+            "has_logo": True,
+            "has_style_reference": True,
+            "color_count": 3,
+            "color_palette": ["#445566", "#778899"],
+        }
+        engine = PromptEngine()
+        base = engine.build_prompt('infographic_1', sample_context)
+        for field_name, value in changes.items():
+            changed = ProductContext(**{**vars(sample_context), field_name: value})
+            prompt = engine.build_prompt('infographic_1', changed)
+            assert prompt != base, f"changing {field_name} served the cached prompt"
+            assert prompt == PromptEngine().build_prompt('infographic_1', changed), field_name
+
+    def test_prompt_cache_evicts_least_recently_used(self, sample_context, monkeypatch):
+        """Test that a cache hit keeps a prompt from being the next one evicted"""
+        monkeypatch.setattr("app.prompts.engine.LEGACY_PROMPT_CACHE_SIZE", 2)
+        engine = PromptEngine()
+        a, b, c = (ProductContext(**{**vars(sample_context), "title": title}) for title in "ABC")
+        with patch.object(engine, "_render_legacy_prompt", wraps=engine._render_legacy_prompt) as render:
+            first_a = engine.build_prompt('main', a)
+            engine.build_prompt('main', b)
+            engine.build_prompt('main', a)  # hit: a becomes most recently used
+            engine.build_prompt('main', c)  # evicts b, not a
+            assert engine.build_prompt('main', a) is first_a
+            assert render.call_count == 3
+            engine.build_prompt('main', b)
+            assert render.call_count == 4
+
     def test_short_features_list_handled(self, prompt_engine):
         """Test handling of less than 3 features"""
         context = ProductContext(
@@ -1,28 +1,49 @@
 """Tests for Supabase storage service with mocked client."""
-import uuid
-from io import BytesIO
+import re
+import struct
+import zlib
+from collections import defaultdict
+from types import SimpleNamespace
 
 import pytest
 from PIL import Image
 
-from app.config import settings
 from app.services.supabase_storage_service import SupabaseStorageService
 
+# Stands in for app.config.settings inside the storage service module
+_FAKE_SETTINGS = SimpleNamespace(
+    supabase_url="https://example.supabase.co",
+    supabase_service_role_key="service-role-key",
+    supabase_anon_key="anon-key",
+    supabase_uploads_bucket="uploads",
+    supabase_generated_bucket="generated",
+)
+
+# Canonical lowercase form produced by str(uuid.uuid4())
+_UUID_RE = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
 
 class FakeBucket:
     def __init__(self, name: str):
         self.name = name
         self.files = {}
+        # Top-level folder -> {path below it: data}, so list(prefix) only
+        # touches the files under that folder
+        self._by_prefix = defaultdict(dict)
 
-    def upload(self, path, file, file_options=None):
+    def _store(self, path, file):
         data = file.read() if hasattr(file, "read") else file
         self.files[path] = data
+        head, _, tail = path.partition("/")
+        if tail:
+            self._by_prefix[head][tail] = data
         return {"path": path}
 
+    def upload(self, path, file, file_options=None):
+        return self._store(path, file)
+
     def update(self, path, file, file_options=None):
-        data = file.read() if hasattr(file, "read") else file
-        self.files[path] = data
-        return {"path": path}
+        return self._store(path, file)
 
     def download(self, path):
         if path not in self.files:
@@ -35,22 +56,34 @@ class FakeBucket:
         return {"signedURL": f"https://signed.test/{self.name}/{path}?exp={expires_in}"}
 
     def remove(self, paths):
-        for path in paths:
-            self.files.pop(path, None)
+        # Delete in place so tests holding a reference to .files see the change
+        doomed = set(paths) & self.files.keys()
+        for path in doomed:
+            del self.files[path]
+        by_head = defaultdict(list)
+        for path in doomed:
+            head, _, tail = path.partition("/")
+            if tail:
+                by_head[head].append(tail)
+        for head, tails in by_head.items():
+            folder = self._by_prefix[head]
+            if len(tails) == len(folder):
+                # Whole folder removed (e.g. delete_session_images): drop it at once
+                del self._by_prefix[head]
+            else:
+                for tail in tails:
+                    del folder[tail]
 
     def list(self, prefix=""):
         if not prefix:
-            keys = list(self.files.keys())
-        else:
-            keys = [k for k in self.files if k.startswith(f"{prefix}/")]
-        rows = []
-        for path in keys:
-            if prefix and path.startswith(f"{prefix}/"):
-                name = path[len(prefix) + 1:]
-            else:
-                name = path
-            rows.append({"name": name})
-        return rows
+            return [{"name": path} for path in self.files]
+        head, _, rest = prefix.partition("/")
+        folder = self._by_prefix.get(head, {})
+        if not rest:
+            return [{"name": name} for name in folder]
+        # Nested prefix: narrow within the top-level folder only
+        start = f"{rest}/"
+        return [{"name": name[len(start):]} for name in folder if name.startswith(start)]
 
     def get_public_url(self, path):
         return f"https://public.test/{self.name}/{path}"
@@ -74,75 +107,109 @@ class FakeSupabaseClient:
         self.storage = FakeStorageAPI()
 
 
-@pytest.fixture
-def storage_service(monkeypatch):
+@pytest.fixture(scope="module")
+def storage_service():
+    """One service + fake client per module; tests isolate by writing under their own session_id"""
     fake_client = FakeSupabaseClient()
     fake_client.storage.from_("uploads")
     fake_client.storage.from_("generated")
 
-    monkeypatch.setattr(
-        "app.services.supabase_storage_service.create_client",
-        lambda url, key: fake_client,
-    )
-    monkeypatch.setattr(settings, "supabase_url", "https://example.supabase.co")
-    monkeypatch.setattr(settings, "supabase_service_role_key", "service-role-key")
-    monkeypatch.setattr(settings, "supabase_anon_key", "anon-key")
-    monkeypatch.setattr(settings, "supabase_uploads_bucket", "uploads")
-    monkeypatch.setattr(settings, "supabase_generated_bucket", "generated")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(
+            "app.services.supabase_storage_service.create_client",
+            lambda url, key: fake_client,
+        )
+        mp.setattr("app.services.supabase_storage_service.settings", _FAKE_SETTINGS)
 
-    service = SupabaseStorageService()
-    return service, fake_client
+        service = SupabaseStorageService()
+        yield service, fake_client
 
 
 @pytest.fixture
+def session_id(request):
+    """Per-test key prefix so tests sharing the fake buckets never see each other's files"""
+    return request.node.name
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def _solid_png(width: int, height: int, rgb: tuple) -> bytes:
+    """Encode a single-colour 8-bit RGB PNG directly, without going through PIL"""
+    row = b"\x00" + bytes(rgb) * width  # filter type 0 (None) + pixels
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)),
+        _png_chunk(b"IDAT", zlib.compress(row * height, 1)),
+        _png_chunk(b"IEND", b""),
+    ))
+
+
+@pytest.fixture(scope="session")
 def test_image_bytes():
-    image = Image.new("RGB", (100, 100), color="red")
-    buffer = BytesIO()
-    image.save(buffer, format="PNG")
-    return buffer.getvalue()
+    return _solid_png(100, 100, (255, 0, 0))
+
+
+@pytest.fixture(scope="session")
+def test_image():
+    """Read-only PIL image shared by tests that hand an image to the service"""
+    return Image.new("RGB", (200, 200), color="blue")
 
 
 def test_save_upload_returns_uuid_and_supabase_path(storage_service, test_image_bytes):
     service, fake_client = storage_service
     upload_id, path = service.save_upload(test_image_bytes, "test.png")
 
-    assert uuid.UUID(upload_id)
+    assert _UUID_RE.match(upload_id)
     assert path == f"supabase://uploads/{upload_id}.png"
     assert f"{upload_id}.png" in fake_client.storage.from_("uploads").files
 
 
-def test_save_generated_image_versioned_saves_versioned_and_latest(storage_service):
+def test_save_generated_image_versioned_saves_versioned_and_latest(storage_service, session_id, test_image):
     service, fake_client = storage_service
-    image = Image.new("RGB", (200, 200), color="blue")
 
-    path = service.save_generated_image_versioned("session-1", "main", image, version=3)
+    path = service.save_generated_image_versioned(session_id, "main", test_image, version=3)
     generated = fake_client.storage.from_("generated").files
 
-    assert path == "supabase://generated/session-1/main.png"
-    assert "session-1/main_v3.png" in generated
-    assert "session-1/main.png" in generated
+    assert path == f"supabase://generated/{session_id}/main.png"
+    assert f"{session_id}/main_v3.png" in generated
+    assert f"{session_id}/main.png" in generated
 
 
-def test_get_file_bytes_downloads_from_supabase(storage_service):
+def test_get_file_bytes_downloads_from_supabase(storage_service, session_id):
     service, fake_client = storage_service
     fake_client.storage.from_("generated").upload(
-        "session-2/main.png",
+        f"{session_id}/main.png",
         b"image-bytes",
         file_options={"content-type": "image/png"},
     )
 
-    content = service.get_file_bytes("supabase://generated/session-2/main.png")
+    content = service.get_file_bytes(f"supabase://generated/{session_id}/main.png")
     assert content == b"image-bytes"
 
 
-def test_get_session_image_count_counts_only_png(storage_service):
+def test_get_session_image_count_counts_only_png(storage_service, session_id):
     service, fake_client = storage_service
     bucket = fake_client.storage.from_("generated")
-    bucket.upload("session-3/main.png", b"x", file_options={"content-type": "image/png"})
-    bucket.upload("session-3/notes.txt", b"y", file_options={"content-type": "text/plain"})
-    bucket.upload("session-3/infographic_1.png", b"z", file_options={"content-type": "image/png"})
+    bucket.upload(f"{session_id}/main.png", b"x", file_options={"content-type": "image/png"})
+    bucket.upload(f"{session_id}/notes.txt", b"y", file_options={"content-type": "text/plain"})
+    bucket.upload(f"{session_id}/infographic_1.png", b"z", file_options={"content-type": "image/png"})
+
+    assert service.get_session_image_count(session_id) == 2
+
+
+def test_delete_session_images_leaves_other_sessions(storage_service, session_id):
+    service, fake_client = storage_service
+    bucket = fake_client.storage.from_("generated")
+    bucket.upload(f"{session_id}/main.png", b"x", file_options={"content-type": "image/png"})
+    bucket.upload(f"{session_id}-other/main.png", b"y", file_options={"content-type": "image/png"})
+
+    service.delete_session_images(session_id)
 
-    assert service.get_session_image_count("session-3") == 2
+    assert service.get_session_image_count(session_id) == 0
+    assert f"{session_id}/main.png" not in bucket.files
+    assert service.get_session_image_count(f"{session_id}-other") == 1
 
 
 def test_health_check_reports_accessible_when_buckets_exist(storage_service):